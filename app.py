@@ -1,331 +1,715 @@
-# app.py
-
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import ollama # Used by chroma_utils for embeddings
-import json
-import os
-import requests # For making HTTP requests to Langflow API
-
-from sqlalchemy import create_engine, inspect, text
-from sqlalchemy.engine import reflection # Good practice to include for schema reflection
-
-# Import chroma_utils.py functions
-import chroma_utils 
-
-app = FastAPI()
-
-# --- Configuration ---
-# Define the Ollama model for SQL generation (make sure you have pulled this: ollama pull sqlcoder)
-OLLAMA_SQL_MODEL = os.getenv("OLLAMA_SQL_MODEL", "sqlcoder:7b-q2_K") 
-OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text") 
-
-
-# Configure your database connection string
-# For SQLite, ensure 'my_test_database.db' is created by running create_db.py
-DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///./my_test_database.db")
-
-# Extract database type from URI for LLM prompt (e.g., "sqlite", "mysql", "postgresql")
-LLM_DB_TYPE = DATABASE_URI.split(":")[0].split("+")[0]
-
-# --- Langflow API Configuration ---
-# IMPORTANT: REPLACE <YOUR_FLOW_ID> with the actual Flow ID copied from Langflow's API Access
-LANGFLOW_API_URL = os.getenv("LANGFLOW_API_URL", "http://localhost:7860/api/v1/run/<YOUR_FLOW_ID>")
-# You might also need a LANGFLOW_API_KEY if your Langflow instance requires authentication
-LANGFLOW_API_KEY = os.getenv("LANGFLOW_API_KEY", "") # Leave empty if no API key is set in Langflow
-
-# --- Pydantic Models for API Request/Response ---
-class QueryRequest(BaseModel):
-    natural_language_query: str
-    
-class QueryResponse(BaseModel):
-    sql_query: str
-    query_result: list # List of dictionaries for rows
-
-# --- Global ChromaDB Client Initialization ---
-# This client will be initialized once when the FastAPI app starts
-chroma_client_global = chroma_utils.initialize_chroma_client()
-
-# --- Helper Function to Get Database Schema (CRITICAL for LLM) ---
-def get_db_schema(db_uri: str) -> str:
-    """
-    Connects to the database using SQLAlchemy and retrieves its schema information.
-    The schema is formatted as a DDL-like string suitable for an LLM.
-    """
-    try:
-        engine = create_engine(db_uri)
-        inspector = inspect(engine)
-        
-        # Get all table names
-        table_names = inspector.get_table_names()
-        
-        schema_info = []
-        for table_name in table_names:
-            schema_info.append(f"CREATE TABLE {table_name} (")
-            
-            columns = inspector.get_columns(table_name)
-            col_definitions = []
-            for col in columns:
-                col_type = str(col['type'])
-                col_def = f"    {col['name']} {col_type}"
-                # Add primary key and not null constraints
-                if col.get('primary_key'):
-                    col_def += " PRIMARY KEY"
-                if not col.get('nullable'):
-                    col_def += " NOT NULL"
-                col_definitions.append(col_def)
-            
-            schema_info.append(",\n".join(col_definitions))
-            schema_info.append(");")
-
-            # Add foreign key constraints if they exist
-            foreign_keys = inspector.get_foreign_keys(table_name)
-            for fk in foreign_keys:
-                # Construct FK definition. Note: SQLite FKs are often defined inline or as table constraints.
-                # This is a generic representation for LLM.
-                schema_info.append(
-                    f"ALTER TABLE {table_name} ADD CONSTRAINT {fk['name']} "
-                    f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
-                    f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])});"
-                )
-            schema_info.append("\n") # Add a newline for readability between tables
-
-        return "\n".join(schema_info)
-
-    except Exception as e:
-        print(f"Error getting database schema: {e}")
-        return f"Error: Could not retrieve database schema. Details: {e}"
-
-def get_structured_db_schema(db_uri: str) -> dict:
-    """
-    Connects to the database using SQLAlchemy and retrieves its schema information
-    in a structured format optimized for ChromaDB indexing and RAG.
-    Returns a dictionary with individual table DDLs and descriptions.
-    """
-    try:
-        engine = create_engine(db_uri)
-        inspector = inspect(engine)
-        
-        # Get all table names
-        table_names = inspector.get_table_names()
-        
-        structured_schema = {
-            "tables": [],
-            "relationships": []
-        }
-        
-        for table_name in table_names:
-            # Build table DDL
-            table_ddl_parts = [f"CREATE TABLE {table_name} ("]
-            
-            columns = inspector.get_columns(table_name)
-            col_definitions = []
-            column_descriptions = []
-            
-            for col in columns:
-                col_type = str(col['type'])
-                col_def = f"    {col['name']} {col_type}"
-                
-                # Add constraints
-                constraints = []
-                if col.get('primary_key'):
-                    col_def += " PRIMARY KEY"
-                    constraints.append("primary key")
-                if not col.get('nullable'):
-                    col_def += " NOT NULL"
-                    constraints.append("not null")
-                
-                col_definitions.append(col_def)
-                
-                # Create column description for better RAG
-                constraint_desc = f" ({', '.join(constraints)})" if constraints else ""
-                column_descriptions.append(f"{col['name']} ({col_type}){constraint_desc}")
-            
-            table_ddl_parts.append(",\n".join(col_definitions))
-            table_ddl_parts.append(");")
-            table_ddl = "\n".join(table_ddl_parts)
-            
-            # Create table description
-            table_description = f"Table {table_name} with columns: {', '.join(column_descriptions)}"
-            
-            # Add foreign key relationships
-            foreign_keys = inspector.get_foreign_keys(table_name)
-            fk_descriptions = []
-            for fk in foreign_keys:
-                fk_constraint = (
-                    f"ALTER TABLE {table_name} ADD CONSTRAINT {fk['name']} "
-                    f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
-                    f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])});"
-                )
-                table_ddl += f"\n{fk_constraint}"
-                
-                # Add relationship description
-                fk_desc = f"{table_name}.{', '.join(fk['constrained_columns'])} -> {fk['referred_table']}.{', '.join(fk['referred_columns'])}"
-                fk_descriptions.append(fk_desc)
-                structured_schema["relationships"].append({
-                    "from_table": table_name,
-                    "from_columns": fk['constrained_columns'],
-                    "to_table": fk['referred_table'],
-                    "to_columns": fk['referred_columns'],
-                    "description": fk_desc
-                })
-            
-            # Add table to structured schema
-            structured_schema["tables"].append({
-                "name": table_name,
-                "ddl": table_ddl,
-                "description": table_description,
-                "columns": column_descriptions,
-                "foreign_keys": fk_descriptions
-            })
-        
-        return structured_schema
-
-    except Exception as e:
-        print(f"Error getting structured database schema: {e}")
-        return {
-            "tables": [],
-            "relationships": [],
-            "error": f"Could not retrieve database schema. Details: {e}"
-        }
-
-# --- Application Startup Event: Index Schema into ChromaDB ---
-@app.on_event("startup")
-async def startup_event():
-    print("Application startup: Indexing database schema into ChromaDB...")
-    try:
-        # Use the new structured schema function for better RAG performance
-        structured_schema = get_structured_db_schema(DATABASE_URI)
-        
-        if structured_schema.get("error"):
-            print(f"Warning: Could not get structured schema for indexing: {structured_schema['error']}")
-            return
-
-        # The structured schema is now optimized for ChromaDB with individual table DDLs
-        # and detailed descriptions for better semantic search
-        chroma_utils.add_schema_to_chroma(chroma_client_global, structured_schema)
-        print(f"Database schema indexed into ChromaDB successfully. Indexed {len(structured_schema['tables'])} tables and {len(structured_schema['relationships'])} relationships.")
-    except Exception as e:
-        print(f"Failed to index schema into ChromaDB: {e}")
-
-# --- API Endpoint to Generate and Execute SQL ---
-@app.post("/query-database", response_model=QueryResponse)
-async def query_database(request: QueryRequest):
-    user_query = request.natural_language_query
-    
-    # 1. Get database schema
-    full_db_schema = get_db_schema(DATABASE_URI)
-    if full_db_schema.startswith("Error"):
-        raise HTTPException(status_code=500, detail=full_db_schema)
-
-    # Determine database type for LLM prompt (e.g., from URI dialect)
-    llm_db_type = DATABASE_URI.split(":")[0].split("+")[0]
-
-    # --- RAG Integration: Query ChromaDB for relevant schema snippets ---
-    # Initialize ChromaDB client (if not already done globally, though better to do once)
-    # For simplicity in this example, we'll re-initialize or assume it's ready.
-    # In a real app, you'd initialize this once at app startup.
-    chroma_client_instance = chroma_utils.initialize_chroma_client()
-    
-    # Query ChromaDB to get relevant schema parts
-    # This is where the magic of RAG happens!
-    relevant_schema_snippets = chroma_utils.query_schema_from_chroma(
-        chroma_client_instance,
-        user_query,
-        n_results=5 # Adjust as needed
-    )
-    
-    # Combine the relevant snippets into a single string for the LLM
-    # If no relevant snippets found, use the full schema (fallback)
-    schema_context_for_llm = "\n".join(relevant_schema_snippets) if relevant_schema_snippets else full_db_schema
-
-
-    # 2. Construct full prompt for Ollama (now incorporating RAG context)
-    # This prompt is what will be sent to your Langflow flow's Chat Input
-    full_prompt_for_ollama = f"""
-You are an expert SQL query generator.
-Your task is to convert natural language questions into SQL queries for a {llm_db_type} database.
-You must only return the SQL query and nothing else.
-Focus only on the tables and columns provided in the schema below that are relevant to the user's question.
-
-Here is the database schema:
-```sql
-{schema_context_for_llm}
-```
-
-Based on this schema, generate a SQL query for the following natural language question:
-{user_query}
-"""
-
-    # --- Langflow API Call ---
-    # IMPORTANT: Replace with your actual Langflow API URL and Flow ID
-    LANGFLOW_API_URL = os.getenv("LANGFLOW_API_URL", "http://localhost:7860/api/v1/run/<YOUR_FLOW_ID>")
-    # Make sure to replace <YOUR_FLOW_ID> with the actual ID from Langflow
-    
-    # Langflow expects a specific input format for its API
-    # For the simplified flow, we send the complete prompt as input_value
-    langflow_payload = {
-        "inputs": {
-            "input_value": full_prompt_for_ollama.strip()
-        }
-    }
-    
-    headers = {"Content-Type": "application/json"}
-    if LANGFLOW_API_KEY:
-        headers["X-API-Key"] = LANGFLOW_API_KEY # Add API key if required by Langflow
-
-    try:
-        print(f"Sending request to Langflow API: {LANGFLOW_API_URL}")
-        # Use requests to call the Langflow API
-        response = requests.post(LANGFLOW_API_URL, json=langflow_payload, headers=headers)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        
-        langflow_result = response.json()
-        
-        # Extract the generated SQL from Langflow's response
-        # The exact path depends on your Langflow flow's output structure.
-        # For a simple ChatOutput, it's often in 'outputs'[0]['results']['message']['data']['text']
-        generated_sql = "Error: Could not extract SQL from Langflow response."
-        if langflow_result and langflow_result.get('outputs'):
-            for output in langflow_result['outputs']:
-                if output.get('results') and output['results'].get('message'):
-                    generated_sql = output['results']['message']['data']['text'].strip()
-                    break
-        
-        print(f"Generated SQL from Langflow:\n{generated_sql}")
-
-        # Basic cleanup: remove common markdown or extra text if LLM includes it
-        if generated_sql.startswith("```sql") and generated_sql.endswith("```"):
-            generated_sql = generated_sql[len("```sql"): -len("```")].strip()
-        
-        # 4. Execute the SQL query (Placeholder - DANGER if not properly secured!)
-        query_result = []
-        try:
-            engine = create_engine(DATABASE_URI)
-            with engine.connect() as connection:
-                # For SQLite, you might not need text() for simple SELECTs,
-                # but it's good practice for general SQL execution.
-                result = connection.execute(text(generated_sql))
-                
-                # Fetch results and column names
-                column_names = list(result.keys())
-                for row in result:
-                    query_result.append(dict(zip(column_names, row))) # Convert row to dictionary
-            
-            if not query_result:
-                print("No results found for the query.")
-
-        except Exception as db_error:
-            print(f"Database query execution failed: {db_error}")
-            raise HTTPException(status_code=500, detail=f"Database query failed. Possible invalid SQL: {db_error}")
-
-        return QueryResponse(sql_query=generated_sql, query_result=query_result)
-
-    except requests.exceptions.ConnectionError:
-        raise HTTPException(status_code=500, detail="Could not connect to Langflow API. Is Langflow running?")
-    except requests.exceptions.RequestException as e:
-        print(f"Langflow API request error: {e}")
-        raise HTTPException(status_code=500, detail=f"Error from Langflow API: {e}")
-    except Exception as e:
-        print(f"An unexpected error occurred in backend: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+# app.py
+
+import asyncio
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import pyarrow as pa # Arrow IPC responses for zero-copy dataframe ingestion
+from pydantic import BaseModel
+import ollama # Used by chroma_utils for embeddings
+import hashlib
+import json
+import orjson # Fast JSON (de)serialization for API payloads
+import os
+import re
+import httpx # For making async HTTP requests to Langflow API
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import reflection # Good practice to include for schema reflection
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+# Import chroma_utils.py functions
+import chroma_utils 
+
+# ORJSONResponse serializes row-dict payloads several times faster than the
+# stdlib json encoder used by the default JSONResponse.
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Compress large responses for clients that advertise gzip support. Row-dict
+# JSON compresses 5-10x, which matters once the backend runs on a different
+# host than the frontend; responses under 1 KB are sent as-is.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# --- Configuration ---
+# Define the Ollama model for SQL generation (make sure you have pulled this: ollama pull sqlcoder)
+OLLAMA_SQL_MODEL = os.getenv("OLLAMA_SQL_MODEL", "sqlcoder:7b-q2_K") 
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text") 
+
+
+# Configure your database connection string
+# For SQLite, ensure 'my_test_database.db' is created by running create_db.py
+DATABASE_URI = os.getenv("DATABASE_URI", "sqlite:///./my_test_database.db")
+
+# Extract database type from URI for LLM prompt (e.g., "sqlite", "mysql", "postgresql")
+LLM_DB_TYPE = DATABASE_URI.split(":")[0].split("+")[0]
+
+# Shared sync engine for schema reflection. Created once so SQLAlchemy's
+# connection pool is actually reused instead of being rebuilt per call.
+# For SQLite a StaticPool holds one long-lived connection shared across
+# threads (sqlite serializes access internally), skipping the per-checkout
+# connect() and WAL setup that dominate short-query latency.
+if DATABASE_URI.startswith("sqlite"):
+    engine = create_engine(
+        DATABASE_URI,
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+else:
+    engine = create_engine(DATABASE_URI, pool_pre_ping=True, pool_size=5, max_overflow=10)
+
+def _get_engine(db_uri: str):
+    """
+    Returns the shared module-level engine for the configured DATABASE_URI,
+    or builds a one-off engine when a different URI is passed in.
+    """
+    if db_uri == DATABASE_URI:
+        return engine
+    return create_engine(db_uri)
+
+# Async engine for executing generated SQL without blocking the event loop.
+# For SQLite this requires the aiosqlite driver (pip install aiosqlite).
+ASYNC_DATABASE_URI = DATABASE_URI.replace("sqlite:", "sqlite+aiosqlite:") \
+    if DATABASE_URI.startswith("sqlite:") else DATABASE_URI
+async_engine = create_async_engine(ASYNC_DATABASE_URI, pool_size=5, max_overflow=10)
+
+# Shared async HTTP client so Langflow calls don't block the event loop and
+# reuse one keep-alive TCP connection instead of paying DNS/handshake per
+# request. Created in the startup event, closed on shutdown.
+http_client: httpx.AsyncClient | None = None
+
+# Cap on concurrent LLM generations. Requests past the cap wait in cheap
+# asyncio queueing here instead of piling up inside Ollama, where extra
+# in-flight generations contend for the model and inflate every request's
+# latency. Tune to the capacity of the Ollama host.
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+_llm_semaphore = asyncio.Semaphore(OLLAMA_MAX_CONCURRENCY)
+
+# --- Langflow API Configuration ---
+# IMPORTANT: REPLACE <YOUR_FLOW_ID> with the actual Flow ID copied from Langflow's API Access
+LANGFLOW_API_URL = os.getenv("LANGFLOW_API_URL", "http://localhost:7860/api/v1/run/<YOUR_FLOW_ID>")
+# You might also need a LANGFLOW_API_KEY if your Langflow instance requires authentication
+LANGFLOW_API_KEY = os.getenv("LANGFLOW_API_KEY", "") # Leave empty if no API key is set in Langflow
+
+# --- LLM Prompt Templates ---
+# The prompt is split into a prefix (instructions + schema) and a suffix
+# (the question). The full-schema prefix is rendered once at startup and is
+# byte-identical across rebuilds, so an LLM server's prefix cache can reuse
+# the prefill for those tokens across requests.
+_PROMPT_PREFIX_TEMPLATE = """
+You are an expert SQL query generator.
+Your task is to convert natural language questions into SQL queries for a {db} database.
+You must only return the SQL query and nothing else.
+Focus only on the tables and columns provided in the schema below that are relevant to the user's question.
+
+Here is the database schema:
+```sql
+{schema}
+```
+
+"""
+
+_PROMPT_SUFFIX_TEMPLATE = """Based on this schema, generate a SQL query for the following natural language question:
+{q}
+"""
+
+# Pre-rendered full-schema prompt prefix, set by refresh_schema_cache()
+SCHEMA_PROMPT: str | None = None
+
+def _render_schema_prompt(schema: str) -> str:
+    """
+    Renders the instructions+schema prompt prefix. Deterministic: the same
+    schema text always yields byte-identical output.
+    """
+    return _PROMPT_PREFIX_TEMPLATE.format(db=LLM_DB_TYPE, schema=schema)
+
+# --- Pydantic Models for API Request/Response ---
+class QueryRequest(BaseModel):
+    natural_language_query: str
+    # Optional server-side pagination so huge result sets are not
+    # materialized and shipped to the client in one response
+    offset: int | None = None
+    limit: int | None = None
+
+class QueryResponse(BaseModel):
+    sql_query: str
+    query_result: list # List of dictionaries for rows
+
+class EmbedRequest(BaseModel):
+    text: str
+
+class BatchQueryItem(BaseModel):
+    id: int
+    natural_language_query: str
+
+class BatchQueryRequest(BaseModel):
+    requests: list[BatchQueryItem]
+
+# --- Global ChromaDB Client Initialization ---
+# This client will be initialized once when the FastAPI app starts
+chroma_client_global = chroma_utils.initialize_chroma_client()
+
+# --- Schema Cache ---
+# The database schema changes rarely, so it is introspected once at startup
+# and served from these module globals instead of re-running a full
+# SQLAlchemy reflection pass (many round-trips to the DB) on every request.
+# Use the /refresh-schema endpoint to recompute after a migration.
+_FULL_SCHEMA: str | None = None
+_STRUCTURED_SCHEMA: dict | None = None
+
+# On-disk layer under the in-process schema cache: startup skips the full
+# reflection pass entirely when the database file hasn't changed.
+_SCHEMA_DISK_CACHE_PATH = os.path.expanduser("~/.cache/sqlagent/schema.json")
+
+def _db_cache_key() -> str | None:
+    """
+    Returns a fingerprint of the SQLite database file (header bytes plus
+    size and mtime), or None for non-file databases, where staleness can't
+    be detected cheaply and the disk cache is skipped.
+    """
+    if not DATABASE_URI.startswith("sqlite:"):
+        return None
+    db_path = DATABASE_URI.split("///", 1)[-1]
+    try:
+        stat = os.stat(db_path)
+        with open(db_path, "rb") as f:
+            header = f.read(4096)
+        return hashlib.blake2b(
+            header + f"{stat.st_size}:{stat.st_mtime_ns}".encode()
+        ).hexdigest()
+    except OSError:
+        return None
+
+def refresh_schema_cache(use_disk_cache: bool = True) -> None:
+    """
+    (Re)introspects the database and updates the module-level schema cache.
+    When the database file fingerprint matches the on-disk cache, the saved
+    schema is loaded instead of running SQLAlchemy reflection.
+    """
+    global _FULL_SCHEMA, _STRUCTURED_SCHEMA, SCHEMA_PROMPT
+
+    cache_key = _db_cache_key()
+    if use_disk_cache and cache_key is not None:
+        try:
+            with open(_SCHEMA_DISK_CACHE_PATH) as f:
+                saved = json.load(f)
+            if saved.get("key") == cache_key:
+                _FULL_SCHEMA = saved["full_schema"]
+                _STRUCTURED_SCHEMA = saved["structured_schema"]
+                SCHEMA_PROMPT = _render_schema_prompt(_FULL_SCHEMA)
+                print("Loaded schema from disk cache (database file unchanged).")
+                return
+        except (OSError, ValueError, KeyError):
+            pass  # Missing or unreadable cache; fall through to reflection
+
+    _FULL_SCHEMA = get_db_schema(DATABASE_URI)
+    _STRUCTURED_SCHEMA = get_structured_db_schema(DATABASE_URI)
+    if not _FULL_SCHEMA.startswith("Error"):
+        SCHEMA_PROMPT = _render_schema_prompt(_FULL_SCHEMA)
+
+    if cache_key is not None and not _STRUCTURED_SCHEMA.get("error"):
+        try:
+            os.makedirs(os.path.dirname(_SCHEMA_DISK_CACHE_PATH), exist_ok=True)
+            with open(_SCHEMA_DISK_CACHE_PATH, "w") as f:
+                json.dump({
+                    "key": cache_key,
+                    "full_schema": _FULL_SCHEMA,
+                    "structured_schema": _STRUCTURED_SCHEMA,
+                }, f)
+        except OSError as e:
+            print(f"Could not persist schema disk cache: {e}")
+
+def _inspect_tables(inspector, table_names: list[str]) -> list[tuple]:
+    """
+    Reflects columns and foreign keys for all tables concurrently.
+
+    Each reflection call is a round-trip to the database, so for N tables the
+    serial version pays 2N sequential queries. SQLAlchemy releases the GIL
+    around DBAPI I/O, so a small thread pool overlaps them.
+    Returns a list of (table_name, columns, foreign_keys) tuples in the
+    original table order.
+    """
+    def _inspect_table(table_name):
+        return (
+            table_name,
+            inspector.get_columns(table_name),
+            inspector.get_foreign_keys(table_name),
+        )
+
+    if len(table_names) <= 1:
+        return [_inspect_table(t) for t in table_names]
+
+    with ThreadPoolExecutor(max_workers=min(8, len(table_names))) as executor:
+        return list(executor.map(_inspect_table, table_names))
+
+# --- Helper Function to Get Database Schema (CRITICAL for LLM) ---
+def get_db_schema(db_uri: str, engine=None) -> str:
+    """
+    Connects to the database using SQLAlchemy and retrieves its schema information.
+    The schema is formatted as a DDL-like string suitable for an LLM.
+    An already-created engine can be passed in to share its connection pool.
+    """
+    try:
+        engine = engine if engine is not None else _get_engine(db_uri)
+        inspector = inspect(engine)
+        
+        # Get all table names
+        table_names = inspector.get_table_names()
+        
+        schema_info = []
+        for table_name, columns, foreign_keys in _inspect_tables(inspector, table_names):
+            schema_info.append(f"CREATE TABLE {table_name} (")
+
+            col_definitions = []
+            for col in columns:
+                col_type = str(col['type'])
+                col_def = f"    {col['name']} {col_type}"
+                # Add primary key and not null constraints
+                if col.get('primary_key'):
+                    col_def += " PRIMARY KEY"
+                if not col.get('nullable'):
+                    col_def += " NOT NULL"
+                col_definitions.append(col_def)
+            
+            schema_info.append(",\n".join(col_definitions))
+            schema_info.append(");")
+
+            # Add foreign key constraints if they exist
+            for fk in foreign_keys:
+                # Construct FK definition. Note: SQLite FKs are often defined inline or as table constraints.
+                # This is a generic representation for LLM.
+                schema_info.append(
+                    f"ALTER TABLE {table_name} ADD CONSTRAINT {fk['name']} "
+                    f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
+                    f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])});"
+                )
+            schema_info.append("\n") # Add a newline for readability between tables
+
+        return "\n".join(schema_info)
+
+    except Exception as e:
+        print(f"Error getting database schema: {e}")
+        return f"Error: Could not retrieve database schema. Details: {e}"
+
+def get_structured_db_schema(db_uri: str, engine=None) -> dict:
+    """
+    Connects to the database using SQLAlchemy and retrieves its schema information
+    in a structured format optimized for ChromaDB indexing and RAG.
+    Returns a dictionary with individual table DDLs and descriptions.
+    An already-created engine can be passed in to share its connection pool.
+    """
+    try:
+        engine = engine if engine is not None else _get_engine(db_uri)
+        inspector = inspect(engine)
+        
+        # Get all table names
+        table_names = inspector.get_table_names()
+        
+        structured_schema = {
+            "tables": [],
+            "relationships": []
+        }
+        
+        for table_name, columns, foreign_keys in _inspect_tables(inspector, table_names):
+            # Build table DDL
+            table_ddl_parts = [f"CREATE TABLE {table_name} ("]
+
+            col_definitions = []
+            column_descriptions = []
+            
+            for col in columns:
+                col_type = str(col['type'])
+                col_def = f"    {col['name']} {col_type}"
+                
+                # Add constraints
+                constraints = []
+                if col.get('primary_key'):
+                    col_def += " PRIMARY KEY"
+                    constraints.append("primary key")
+                if not col.get('nullable'):
+                    col_def += " NOT NULL"
+                    constraints.append("not null")
+                
+                col_definitions.append(col_def)
+                
+                # Create column description for better RAG
+                constraint_desc = f" ({', '.join(constraints)})" if constraints else ""
+                column_descriptions.append(f"{col['name']} ({col_type}){constraint_desc}")
+            
+            table_ddl_parts.append(",\n".join(col_definitions))
+            table_ddl_parts.append(");")
+
+            # Create table description
+            table_description = f"Table {table_name} with columns: {', '.join(column_descriptions)}"
+            
+            # Add foreign key relationships
+            fk_descriptions = []
+            for fk in foreign_keys:
+                fk_constraint = (
+                    f"ALTER TABLE {table_name} ADD CONSTRAINT {fk['name']} "
+                    f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
+                    f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])});"
+                )
+                # Collect FK constraints in the parts list; the DDL string is
+                # joined once below instead of repeated += concatenation.
+                table_ddl_parts.append(fk_constraint)
+
+                # Add relationship description
+                fk_desc = f"{table_name}.{', '.join(fk['constrained_columns'])} -> {fk['referred_table']}.{', '.join(fk['referred_columns'])}"
+                fk_descriptions.append(fk_desc)
+                structured_schema["relationships"].append({
+                    "from_table": table_name,
+                    "from_columns": fk['constrained_columns'],
+                    "to_table": fk['referred_table'],
+                    "to_columns": fk['referred_columns'],
+                    "description": fk_desc
+                })
+            
+            # Join the DDL (including any FK constraints) in a single pass
+            table_ddl = "\n".join(table_ddl_parts)
+
+            # Add table to structured schema
+            structured_schema["tables"].append({
+                "name": table_name,
+                "ddl": table_ddl,
+                "description": table_description,
+                "columns": column_descriptions,
+                "foreign_keys": fk_descriptions
+            })
+        
+        return structured_schema
+
+    except Exception as e:
+        print(f"Error getting structured database schema: {e}")
+        return {
+            "tables": [],
+            "relationships": [],
+            "error": f"Could not retrieve database schema. Details: {e}"
+        }
+
+def _index_schema_into_chroma(structured_schema: dict, force: bool = False) -> bool:
+    """
+    Indexes the structured schema into ChromaDB unless its fingerprint
+    matches the one persisted from a previous run, so restarts with an
+    unchanged schema pay no indexing cost at all. Returns True when
+    indexing ran, False when it was skipped.
+    """
+    fingerprint = hashlib.sha256(
+        json.dumps(structured_schema, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    if not force and chroma_utils.read_schema_fingerprint() == fingerprint:
+        print("Schema fingerprint unchanged; skipping ChromaDB indexing.")
+        return False
+    chroma_utils.add_schema_to_chroma(chroma_client_global, structured_schema)
+    chroma_utils.write_schema_fingerprint(fingerprint)
+    return True
+
+# --- Application Startup Event: Index Schema into ChromaDB ---
+@app.on_event("startup")
+async def startup_event():
+    global http_client
+    # Expose the singleton client on app.state for FastAPI idiom compliance;
+    # chroma_client_global stays as the module-level reference.
+    app.state.chroma = chroma_client_global
+    http_client = httpx.AsyncClient(
+        timeout=60.0,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+
+    print("Application startup: Indexing database schema into ChromaDB...")
+    try:
+        # Introspect once and cache; requests read from the module globals.
+        refresh_schema_cache()
+        structured_schema = _STRUCTURED_SCHEMA
+
+        if structured_schema.get("error"):
+            print(f"Warning: Could not get structured schema for indexing: {structured_schema['error']}")
+            return
+
+        # The structured schema is now optimized for ChromaDB with individual table DDLs
+        # and detailed descriptions for better semantic search
+        if _index_schema_into_chroma(structured_schema):
+            print(f"Database schema indexed into ChromaDB successfully. Indexed {len(structured_schema['tables'])} tables and {len(structured_schema['relationships'])} relationships.")
+    except Exception as e:
+        print(f"Failed to index schema into ChromaDB: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if http_client is not None:
+        await http_client.aclose()
+    await async_engine.dispose()
+
+# --- API Endpoint to Refresh the Schema Cache ---
+@app.post("/refresh-schema")
+async def refresh_schema():
+    """
+    Recomputes the cached database schema and re-indexes it into ChromaDB.
+    Call this after schema migrations instead of restarting the app.
+    """
+    # Reflection and re-indexing are blocking and can take a while on big
+    # schemas; run them on a worker thread so in-flight queries keep serving.
+    await asyncio.to_thread(refresh_schema_cache, use_disk_cache=False)
+    if _STRUCTURED_SCHEMA.get("error"):
+        raise HTTPException(status_code=500, detail=_STRUCTURED_SCHEMA["error"])
+    await asyncio.to_thread(_index_schema_into_chroma, _STRUCTURED_SCHEMA, force=True)
+    return {
+        "status": "ok",
+        "tables_indexed": len(_STRUCTURED_SCHEMA["tables"]),
+        "relationships_indexed": len(_STRUCTURED_SCHEMA["relationships"]),
+    }
+
+# --- API Endpoint to Embed Text ---
+@app.post("/embed")
+async def embed(request: EmbedRequest):
+    """
+    Returns the (normalized, cached) embedding for a piece of text. Used by
+    the Streamlit frontend's semantic prompt cache.
+    """
+    try:
+        # Ollama's embed call is blocking; keep it off the event loop
+        embedding = await asyncio.to_thread(
+            chroma_utils.get_ollama_embedding_cached, request.text
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding failed: {e}")
+    return {"embedding": embedding}
+
+# --- SQL Generation and Execution Helpers ---
+async def _generate_sql(user_query: str) -> str:
+    """
+    Builds the RAG prompt for the question and asks Langflow/Ollama to
+    generate a SQL query. Raises HTTPException on Langflow failures.
+    """
+    # 1. Get database schema (cached at startup; refreshed via /refresh-schema)
+    full_db_schema = _FULL_SCHEMA if _FULL_SCHEMA is not None else get_db_schema(DATABASE_URI)
+    if full_db_schema.startswith("Error"):
+        raise HTTPException(status_code=500, detail=full_db_schema)
+
+    # --- RAG Integration: Query ChromaDB for relevant schema snippets ---
+    # Query ChromaDB to get relevant schema parts, reusing the client
+    # initialized once at app startup.
+    # This is where the magic of RAG happens!
+    # The Chroma query (and the embedding call inside it) is blocking, so it
+    # runs on a worker thread instead of stalling the event loop while other
+    # requests are in flight.
+    relevant_schema_snippets = await asyncio.to_thread(
+        chroma_utils.query_schema_from_chroma,
+        chroma_client_global,
+        user_query,
+        n_results=5 # Adjust as needed
+    )
+
+    # 2. Construct full prompt for Ollama (prefix + question suffix)
+    # RAG snippets produce a per-question prefix; when there are none we fall
+    # back to SCHEMA_PROMPT, the prefix pre-rendered at startup. Reusing the
+    # exact same bytes lets the LLM server's prefix cache skip re-prefilling
+    # the instructions+schema tokens.
+    if relevant_schema_snippets:
+        prompt_prefix = _render_schema_prompt("\n".join(relevant_schema_snippets))
+    elif SCHEMA_PROMPT is not None:
+        prompt_prefix = SCHEMA_PROMPT
+    else:
+        prompt_prefix = _render_schema_prompt(full_db_schema)
+    full_prompt_for_ollama = prompt_prefix + _PROMPT_SUFFIX_TEMPLATE.format(q=user_query)
+
+    # Langflow expects a specific input format for its API
+    # For the simplified flow, we send the complete prompt as input_value
+    langflow_payload = {
+        "inputs": {
+            "input_value": full_prompt_for_ollama.strip()
+        }
+    }
+
+    headers = {"Content-Type": "application/json"}
+    if LANGFLOW_API_KEY:
+        headers["X-API-Key"] = LANGFLOW_API_KEY # Add API key if required by Langflow
+
+    try:
+        print(f"Sending request to Langflow API: {LANGFLOW_API_URL}")
+        # Use the shared async client to call the Langflow API, serializing
+        # the payload with orjson instead of httpx's stdlib json= helper.
+        # The semaphore bounds how many generations are in flight at once
+        # (see OLLAMA_MAX_CONCURRENCY above).
+        async with _llm_semaphore:
+            response = await http_client.post(
+                LANGFLOW_API_URL, content=orjson.dumps(langflow_payload), headers=headers
+            )
+        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+    except httpx.ConnectError:
+        raise HTTPException(status_code=500, detail="Could not connect to Langflow API. Is Langflow running?")
+    except httpx.HTTPError as e:
+        print(f"Langflow API request error: {e}")
+        raise HTTPException(status_code=500, detail=f"Error from Langflow API: {e}")
+
+    langflow_result = orjson.loads(response.content)
+
+    # Extract the generated SQL from Langflow's response
+    # The exact path depends on your Langflow flow's output structure.
+    # For a simple ChatOutput, it's often in 'outputs'[0]['results']['message']['data']['text']
+    generated_sql = "Error: Could not extract SQL from Langflow response."
+    if langflow_result and langflow_result.get('outputs'):
+        for output in langflow_result['outputs']:
+            if output.get('results') and output['results'].get('message'):
+                generated_sql = output['results']['message']['data']['text'].strip()
+                break
+
+    print(f"Generated SQL from Langflow:\n{generated_sql}")
+
+    # Basic cleanup: remove common markdown or extra text if LLM includes it
+    if generated_sql.startswith("```sql") and generated_sql.endswith("```"):
+        generated_sql = generated_sql[len("```sql"): -len("```")].strip()
+
+    return generated_sql
+
+# --- SQL Safety Gate ---
+# LLM-generated SQL is untrusted input; anything that writes or alters the
+# database is rejected before execution. Compiled once at import time: a
+# plain word-boundary alternation has no nested quantifiers, so matching
+# stays linear in the SQL length with no catastrophic backtracking.
+_UNSAFE_SQL_PATTERN = re.compile(
+    r"\b(drop|delete|update|insert|truncate|alter|create|replace|grant|revoke|pragma|attach|vacuum)\b",
+    re.IGNORECASE,
+)
+
+def _check_sql_safety(generated_sql: str) -> None:
+    """
+    Rejects generated SQL containing write/DDL keywords. Raises a 400
+    HTTPException naming the offending keyword; read-only SQL passes.
+    """
+    match = _UNSAFE_SQL_PATTERN.search(generated_sql)
+    if match:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Generated SQL was rejected: statement contains '{match.group(0)}', "
+                   "only read-only queries are executed.",
+        )
+
+def _apply_pagination(generated_sql: str, limit: int | None, offset: int | None) -> str:
+    """
+    Wraps a generated SELECT in a LIMIT/OFFSET subquery when the caller
+    requested pagination; without a limit the SQL runs unchanged.
+    """
+    if limit is None:
+        return generated_sql
+    inner_sql = generated_sql.strip().rstrip(";")
+    return f"SELECT * FROM ({inner_sql}) AS paged LIMIT {int(limit)} OFFSET {int(offset or 0)}"
+
+async def _execute_generated_sql(generated_sql: str, limit: int | None = None,
+                                 offset: int | None = None) -> list:
+    """
+    Executes the generated SQL on the async engine and returns the rows as
+    a list of dictionaries, optionally paginated. Raises HTTPException on
+    execution failures.
+    """
+    _check_sql_safety(generated_sql)
+    generated_sql = _apply_pagination(generated_sql, limit, offset)
+    try:
+        async with async_engine.connect() as connection:
+            # For SQLite, you might not need text() for simple SELECTs,
+            # but it's good practice for general SQL execution.
+            # stream() uses a server-side cursor so large results are not
+            # buffered whole before iteration begins, and mappings()
+            # yields dict-like rows natively, skipping the per-row
+            # zip + dict construction.
+            result = await connection.stream(text(generated_sql))
+            query_result = [dict(row) async for row in result.mappings()]
+
+        if not query_result:
+            print("No results found for the query.")
+        return query_result
+
+    except Exception as db_error:
+        print(f"Database query execution failed: {db_error}")
+        raise HTTPException(status_code=500, detail=f"Database query failed. Possible invalid SQL: {db_error}")
+
+# MIME type for Arrow IPC stream responses
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+def _rows_to_arrow_ipc(query_result: list, generated_sql: str) -> bytes:
+    """
+    Serializes result rows to an Arrow IPC stream. The generated SQL rides
+    along in the schema metadata so clients get it without a second field.
+    """
+    table = pa.Table.from_pylist(query_result)
+    table = table.replace_schema_metadata({"sql_query": generated_sql})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# --- API Endpoint to Generate and Execute SQL ---
+@app.post("/query-database", response_model=QueryResponse)
+async def query_database(request: QueryRequest, http_request: Request):
+    try:
+        generated_sql = await _generate_sql(request.natural_language_query)
+        query_result = await _execute_generated_sql(generated_sql, request.limit, request.offset)
+
+        # Clients that accept Arrow get columnar IPC bytes, which pandas can
+        # ingest zero-copy instead of re-parsing row-dict JSON.
+        if ARROW_MIME in http_request.headers.get("accept", ""):
+            return Response(
+                content=_rows_to_arrow_ipc(query_result, generated_sql),
+                media_type=ARROW_MIME,
+            )
+
+        return QueryResponse(sql_query=generated_sql, query_result=query_result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"An unexpected error occurred in backend: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+# --- Batch Variant: Several Questions in One Request ---
+@app.post("/batch")
+async def query_database_batch(request: BatchQueryRequest):
+    """
+    Runs several natural-language queries concurrently in one HTTP call.
+    Per-question failures are reported in that question's result entry
+    instead of failing the whole batch. Results keep the caller's ids.
+    """
+    async def _run(item: BatchQueryItem) -> dict:
+        try:
+            generated_sql = await _generate_sql(item.natural_language_query)
+            query_result = await _execute_generated_sql(generated_sql)
+            return {"id": item.id, "sql_query": generated_sql,
+                    "query_result": query_result, "error": None}
+        except HTTPException as e:
+            return {"id": item.id, "sql_query": "", "query_result": [],
+                    "error": str(e.detail)}
+        except Exception as e:
+            print(f"An unexpected error occurred in batch item {item.id}: {e}")
+            return {"id": item.id, "sql_query": "", "query_result": [],
+                    "error": f"An unexpected error occurred: {e}"}
+
+    results = await asyncio.gather(*[_run(item) for item in request.requests])
+    return {"results": list(results)}
+
+# --- Streaming Variant: SQL First, Rows When Ready ---
+@app.post("/query-database-stream")
+async def query_database_stream(request: QueryRequest):
+    """
+    Server-sent-events variant of /query-database. Emits a `sql` frame as
+    soon as the LLM returns the generated query, then a `result` frame once
+    the database has executed it, so clients can show the SQL while the
+    query is still running. Errors arrive as an `error` frame.
+    """
+    user_query = request.natural_language_query
+
+    def _sse_frame(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: " + orjson.dumps(data).decode() + "\n\n"
+
+    async def event_stream():
+        try:
+            generated_sql = await _generate_sql(user_query)
+            yield _sse_frame("sql", {"sql_query": generated_sql})
+            query_result = await _execute_generated_sql(generated_sql, request.limit, request.offset)
+            yield _sse_frame("result", {"query_result": query_result})
+        except HTTPException as e:
+            yield _sse_frame("error", {"detail": e.detail})
+        except Exception as e:
+            print(f"An unexpected error occurred in backend: {e}")
+            yield _sse_frame("error", {"detail": f"An unexpected error occurred: {e}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -1,46 +1,221 @@
 # chroma_utils.py
 
 import chromadb
+import hashlib
 import os
+import re
+import time
+import numpy as np
 import ollama # To interact with Ollama for embeddings
+from collections import OrderedDict
+
+# Numba is an optional accelerator for the brute-force similarity scan;
+# without it the NumPy matmul path is used instead.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 # --- Configuration ---
 # Define the directory where ChromaDB will store its data
-# This directory will be created if it doesn't exist.
-CHROMA_DB_PATH = "D:\chromadb"
+# This directory will be created if it doesn't exist. Defaults to a folder
+# next to this file; override with the CHROMA_DB_PATH environment variable.
+# (The old hardcoded "D:\chromadb" broke persistence on non-Windows machines,
+# silently forcing a full re-embed on every run.)
+CHROMA_DB_PATH = os.getenv(
+    "CHROMA_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "chromadb_data"),
+)
 
 # Define the Ollama model to use for generating embeddings
 # 'nomic-embed-text' is a good general-purpose embedding model available on Ollama.
 # Make sure you have pulled this model: `ollama pull nomic-embed-text`
 OLLAMA_EMBEDDING_MODEL = "nomic-embed-text"
 
+# --- Collection Configuration ---
+# Embeddings are L2-normalized at generation time (see _normalize below), so
+# inner product equals cosine similarity and the index can use the cheaper
+# "ip" space — a plain dot product per vector, no sqrt/div at query time.
+# The HNSW parameters trade a slightly heavier index build for better recall
+# at n_results=5 and a fast search_ef. Note: these only take effect when the
+# collection is first created; delete the persisted collection to re-tune.
+COLLECTION_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# --- Brute-Force Index for Tiny Corpora ---
+# A typical application schema yields a few dozen documents. At that size a
+# single BLAS matmul over an in-memory float32 matrix (equivalent to FAISS
+# IndexFlatIP) beats ChromaDB's per-query HNSW + Python overhead, so queries
+# are served from this mirror whenever the corpus is small enough.
+# ChromaDB remains the persistent store; the mirror is rebuilt from it.
+BRUTE_FORCE_MAX_DOCS = 2000
+
+# Storage dtype for the mirror. float16 halves the bytes moved per scan with
+# negligible recall loss at 768 dimensions. Set to np.float32 to enable the
+# Numba kernel, which cannot operate on half precision on CPU.
+BRUTE_FORCE_DTYPE = np.float16
+
+_BF_MATRIX: np.ndarray | None = None   # (N, dim) BRUTE_FORCE_DTYPE, L2-normalized rows
+_BF_DOCUMENTS: list[str] = []          # Documents parallel to matrix rows
+_BF_METADATAS: list[dict] = []         # Metadatas parallel to matrix rows
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _bf_scores_jit(mat, q):
+        # LLVM-vectorized dot products over the rows; on small-to-medium N
+        # this avoids the BLAS dispatch overhead of a matmul call.
+        n, d = mat.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            s = 0.0
+            for j in range(d):
+                s += mat[i, j] * q[j]
+            scores[i] = s
+        return scores
+
+def _bf_scores(mat: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    Computes inner-product similarity of the query against all matrix rows,
+    using the Numba-JIT kernel when available and NumPy otherwise.
+    """
+    if njit is not None and mat.dtype == np.float32:
+        return _bf_scores_jit(mat, q)
+    return (mat @ q.astype(mat.dtype, copy=False)).astype(np.float32)
+
+def _rebuild_brute_force_index(collection) -> None:
+    """
+    Rebuilds the in-memory brute-force mirror from the ChromaDB collection.
+    Embeddings are L2-normalized so an inner product equals cosine similarity.
+    """
+    global _BF_MATRIX, _BF_DOCUMENTS, _BF_METADATAS
+    try:
+        data = collection.get(include=['embeddings', 'documents', 'metadatas'])
+        embeddings = data.get('embeddings')
+        if embeddings is None or len(embeddings) == 0:
+            _BF_MATRIX = None
+            _BF_DOCUMENTS = []
+            _BF_METADATAS = []
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+        # Normalize in float32 for accuracy, then store at the reduced dtype
+        _BF_MATRIX = matrix.astype(BRUTE_FORCE_DTYPE, copy=False)
+        _BF_DOCUMENTS = list(data['documents'])
+        _BF_METADATAS = [m or {} for m in data['metadatas']]
+        _KNOWN_TABLES.update(
+            m['table_name'] for m in _BF_METADATAS if m.get('table_name')
+        )
+        print(f"Brute-force index rebuilt with {len(_BF_DOCUMENTS)} documents.")
+    except Exception as e:
+        print(f"Could not rebuild brute-force index (ChromaDB will serve queries): {e}")
+        _BF_MATRIX = None
+        _BF_DOCUMENTS = []
+        _BF_METADATAS = []
+
+# --- Keyword Pre-Filter ---
+# Table names seen at index time, used to narrow the search space with a
+# metadata filter when the question mentions a table explicitly.
+_KNOWN_TABLES: set[str] = set()
+
+def _candidate_tables(natural_language_query: str) -> list[str]:
+    """
+    Returns the known table names mentioned in the query, with naive
+    singular/plural folding so e.g. "employees" matches table "Employee".
+    An empty list means no keyword hint was found and the search should
+    run unfiltered.
+    """
+    tokens = set(re.findall(r"[a-z0-9_]+", natural_language_query.lower()))
+    folded_tokens = {token.rstrip("s") for token in tokens}
+    candidates = []
+    for table_name in _KNOWN_TABLES:
+        lowered = table_name.lower()
+        if lowered in tokens or lowered.rstrip("s") in folded_tokens:
+            candidates.append(table_name)
+    return candidates
+
+# --- Query Embedding Cache ---
+# Process-local LRU cache for query embeddings, keyed on a SHA-256 of the
+# query text. Repeated (or re-clicked) questions skip the Ollama HTTP call
+# entirely on the hot /query-database path.
+_EMB_CACHE: OrderedDict[str, tuple[list[float], float]] = OrderedDict()
+_EMB_CACHE_MAX = 1024       # Maximum number of cached embeddings
+_EMB_CACHE_TTL = 3600       # Seconds before a cached embedding expires
+
+# --- Schema Fingerprint Sidecar ---
+# A SHA-256 over the whole structured schema is stored next to the ChromaDB
+# data; when it matches on startup, indexing can be skipped entirely.
+_SCHEMA_FP_FILENAME = ".schema_fp"
+
+def read_schema_fingerprint() -> str | None:
+    """
+    Returns the schema fingerprint persisted alongside the ChromaDB data,
+    or None when no fingerprint has been written yet.
+    """
+    fp_path = os.path.join(CHROMA_DB_PATH, _SCHEMA_FP_FILENAME)
+    try:
+        with open(fp_path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def write_schema_fingerprint(fingerprint: str) -> None:
+    """
+    Persists the schema fingerprint alongside the ChromaDB data.
+    """
+    fp_path = os.path.join(CHROMA_DB_PATH, _SCHEMA_FP_FILENAME)
+    try:
+        with open(fp_path, "w") as f:
+            f.write(fingerprint)
+    except OSError as e:
+        print(f"Could not persist schema fingerprint: {e}")
+
 # --- ChromaDB Client Initialization ---
+_CHROMA_CLIENT = None
+
 def initialize_chroma_client():
     """
     Initializes and returns a persistent ChromaDB client.
-    Ensures the data directory exists.
+
+    The client is a process-wide singleton: repeated calls return the same
+    instance without re-checking the data directory or re-opening the store.
     """
-    if not os.path.exists(CHROMA_DB_PATH):
-        os.makedirs(CHROMA_DB_PATH)
-        print(f"Created ChromaDB data directory: {CHROMA_DB_PATH}")
-    
+    global _CHROMA_CLIENT
+    if _CHROMA_CLIENT is not None:
+        return _CHROMA_CLIENT
+
+    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+
     try:
-        client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        _CHROMA_CLIENT = chromadb.PersistentClient(path=CHROMA_DB_PATH)
         print(f"ChromaDB persistent client initialized at: {CHROMA_DB_PATH}")
-        return client
+        return _CHROMA_CLIENT
     except Exception as e:
         print(f"Error initializing ChromaDB client: {e}")
         raise
 
 # --- Embedding Function using Ollama ---
+def _normalize(embedding: list[float]) -> list[float]:
+    """
+    L2-normalizes an embedding so inner product equals cosine similarity.
+    """
+    v = np.asarray(embedding, dtype=np.float32)
+    v /= (np.linalg.norm(v) + 1e-12)
+    return v.tolist()
+
 def get_ollama_embedding(text: str) -> list[float]:
     """
-    Generates an embedding for the given text using the specified Ollama model.
+    Generates an L2-normalized embedding for the given text using the
+    specified Ollama model.
     """
     try:
         # Ensure Ollama server is running and the embedding model is pulled
         response = ollama.embeddings(model=OLLAMA_EMBEDDING_MODEL, prompt=text)
-        return response['embedding']
+        return _normalize(response['embedding'])
     except ollama.ResponseError as e:
         print(f"Error generating embedding with Ollama: {e}")
         raise
@@ -48,6 +223,55 @@ def get_ollama_embedding(text: str) -> list[float]:
         print(f"An unexpected error occurred during embedding: {e}")
         raise
 
+def get_ollama_embedding_cached(text: str) -> list[float]:
+    """
+    Cached wrapper around get_ollama_embedding.
+
+    Looks up the SHA-256 of the text in a process-local LRU cache with a
+    TTL; on a hit the Ollama call is skipped, on a miss the embedding is
+    generated and stored. Oldest entries are evicted past _EMB_CACHE_MAX.
+    """
+    key = hashlib.sha256(text.encode()).hexdigest()
+    now = time.monotonic()
+
+    cached = _EMB_CACHE.get(key)
+    if cached is not None:
+        embedding, expires_at = cached
+        if now < expires_at:
+            _EMB_CACHE.move_to_end(key)  # Mark as most recently used
+            return embedding
+        del _EMB_CACHE[key]  # Expired entry
+
+    embedding = get_ollama_embedding(text)
+    _EMB_CACHE[key] = (embedding, now + _EMB_CACHE_TTL)
+    while len(_EMB_CACHE) > _EMB_CACHE_MAX:
+        _EMB_CACHE.popitem(last=False)  # Evict least recently used
+    return embedding
+
+def get_ollama_embeddings(texts: list[str]) -> list[list[float]]:
+    """
+    Generates embeddings for a batch of texts in a single Ollama call.
+    One batched request replaces N sequential HTTP round-trips, so startup
+    indexing no longer scales with the number of schema documents.
+    """
+    if not texts:
+        return []
+    try:
+        # The batch embed API sends all documents in one request.
+        response = ollama.embed(model=OLLAMA_EMBEDDING_MODEL, input=texts)
+        return [_normalize(embedding) for embedding in response['embeddings']]
+    except AttributeError:
+        # Older ollama clients don't expose the batch `embed` API;
+        # fall back to embedding each document individually.
+        print("Batch embed API unavailable; falling back to per-document embedding.")
+        return [get_ollama_embedding(text) for text in texts]
+    except ollama.ResponseError as e:
+        print(f"Error generating batch embeddings with Ollama: {e}")
+        raise
+    except Exception as e:
+        print(f"An unexpected error occurred during batch embedding: {e}")
+        raise
+
 # --- Adding Schema to ChromaDB ---
 def add_schema_to_chroma(client: chromadb.PersistentClient, schema_info: dict):
     """
@@ -72,7 +296,7 @@ def add_schema_to_chroma(client: chromadb.PersistentClient, schema_info: dict):
                      and 'description' from relationships.
     """
     collection_name = "sql_schema_embeddings"
-    collection = client.get_or_create_collection(name=collection_name)
+    collection = client.get_or_create_collection(name=collection_name, metadata=COLLECTION_METADATA)
     print(f"Using ChromaDB collection: {collection_name}")
 
     documents = []
@@ -88,36 +312,86 @@ def add_schema_to_chroma(client: chromadb.PersistentClient, schema_info: dict):
         # Combine DDL and description for better context in embedding
         doc_content = f"Table: {table_name}\nDDL: {ddl}\nDescription: {description}"
         
+        _KNOWN_TABLES.add(table_name)
+        # Lowercased table and column names enable keyword-based metadata
+        # filtering at query time.
+        keywords = " ".join(
+            [table_name.lower()]
+            + [col_desc.split(" ")[0].lower() for col_desc in table.get("columns", [])]
+        )
+
         documents.append(doc_content)
-        metadatas.append({"type": "table_schema", "table_name": table_name})
+        metadatas.append({
+            "type": "table_schema",
+            "table_name": table_name,
+            "keywords": keywords,
+            # Content hash used to skip re-embedding unchanged tables on restart
+            "doc_hash": hashlib.sha256(doc_content.encode()).hexdigest(),
+        })
         ids.append(f"schema_table_{table_name}_{i}")
 
     # Add relationship descriptions
     for i, rel in enumerate(schema_info.get("relationships", [])):
         rel_description = rel.get("description", f"Database relationship {i}.")
-        
+
         documents.append(rel_description)
-        metadatas.append({"type": "relationship"})
+        metadatas.append({
+            "type": "relationship",
+            "doc_hash": hashlib.sha256(rel_description.encode()).hexdigest(),
+        })
         ids.append(f"schema_rel_{i}")
 
-    # Generate embeddings and add to collection
-    if documents:
-        # ChromaDB can automatically embed if you set an embedding function for the collection.
-        # However, since we're using Ollama, we'll manually embed here for clarity.
-        # If you want ChromaDB to handle it, you'd pass `embedding_function=ollama_embedding_function`
-        # when creating the collection.
-        embeddings = [get_ollama_embedding(doc) for doc in documents]
-        
-        # Add or update documents in the collection
-        collection.upsert(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids,
-            embeddings=embeddings # Provide pre-computed embeddings
-        )
-        print(f"Added/Updated {len(documents)} schema documents to ChromaDB.")
-    else:
+    if not documents:
         print("No schema documents to add to ChromaDB.")
+        return
+
+    # Compare content hashes against what is already persisted so unchanged
+    # documents are not re-embedded on every startup.
+    existing_hashes = {}
+    try:
+        existing = collection.get(ids=ids, include=['metadatas'])
+        for doc_id, metadata in zip(existing['ids'], existing['metadatas']):
+            existing_hashes[doc_id] = (metadata or {}).get('doc_hash')
+    except Exception as e:
+        print(f"Could not read existing schema documents (will re-embed all): {e}")
+
+    changed = [
+        idx for idx, doc_id in enumerate(ids)
+        if existing_hashes.get(doc_id) != metadatas[idx]['doc_hash']
+    ]
+
+    if not changed:
+        print(f"All {len(documents)} schema documents unchanged; skipping re-embedding.")
+        if _BF_MATRIX is None:
+            _rebuild_brute_force_index(collection)
+        return
+
+    changed_documents = [documents[idx] for idx in changed]
+
+    # ChromaDB can automatically embed if you set an embedding function for the collection.
+    # However, since we're using Ollama, we'll manually embed here for clarity.
+    # If you want ChromaDB to handle it, you'd pass `embedding_function=ollama_embedding_function`
+    # when creating the collection.
+    # Byte-identical documents (e.g. duplicate FK descriptions) are embedded
+    # only once and the results mapped back to every occurrence.
+    unique_index: dict[str, int] = {}
+    for doc in changed_documents:
+        unique_index.setdefault(doc, len(unique_index))
+    unique_embeddings = get_ollama_embeddings(list(unique_index))
+    embeddings = [unique_embeddings[unique_index[doc]] for doc in changed_documents]
+
+    # Add or update only the changed documents in the collection
+    collection.upsert(
+        documents=changed_documents,
+        metadatas=[metadatas[idx] for idx in changed],
+        ids=[ids[idx] for idx in changed],
+        embeddings=embeddings # Provide pre-computed embeddings
+    )
+    print(f"Added/Updated {len(changed)} schema documents to ChromaDB "
+          f"({len(documents) - len(changed)} unchanged).")
+
+    # Keep the in-memory brute-force mirror in sync with the collection
+    _rebuild_brute_force_index(collection)
 
 # --- Querying Schema from ChromaDB ---
 def query_schema_from_chroma(client: chromadb.PersistentClient, natural_language_query: str, n_results: int = 5) -> list[str]:
@@ -139,14 +413,59 @@ def query_schema_from_chroma(client: chromadb.PersistentClient, natural_language
         print(f"Collection '{collection_name}' not found. Please add schema data first.")
         return []
 
-    # Generate embedding for the query
-    query_embedding = get_ollama_embedding(natural_language_query)
+    # Generate embedding for the query (cached for repeated questions)
+    query_embedding = get_ollama_embedding_cached(natural_language_query)
+
+    # Lazily build the brute-force mirror on the first query after a restart
+    if _BF_MATRIX is None:
+        _rebuild_brute_force_index(collection)
+
+    # When the question names a known table, narrow the search to those
+    # tables; an empty candidate list means the search runs unfiltered.
+    candidate_tables = _candidate_tables(natural_language_query)
+
+    # For tiny corpora, a vectorized inner-product scan over the in-memory
+    # mirror is faster than going through ChromaDB's query machinery.
+    if _BF_MATRIX is not None and len(_BF_DOCUMENTS) <= BRUTE_FORCE_MAX_DOCS:
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q /= max(np.linalg.norm(q), 1e-12)
+        scores = _bf_scores(_BF_MATRIX, q)
+
+        pool = np.arange(len(_BF_DOCUMENTS))
+        if candidate_tables:
+            allowed = set(candidate_tables)
+            keep = [
+                idx for idx, metadata in enumerate(_BF_METADATAS)
+                if metadata.get('table_name') in allowed
+            ]
+            if keep:
+                pool = np.asarray(keep)
+
+        pool_scores = scores[pool]
+        k = min(n_results, len(pool))
+        top = np.argpartition(-pool_scores, k - 1)[:k]
+        top_indices = pool[top[np.argsort(-pool_scores[top])]]
+
+        relevant_schema_snippets = []
+        print(f"\nFound {k} relevant schema snippets (brute-force scan):")
+        for rank, idx in enumerate(top_indices):
+            metadata = _BF_METADATAS[idx]
+            doc = _BF_DOCUMENTS[idx]
+            print(f"  Snippet {rank+1} (Similarity: {scores[idx]:.4f}, Type: {metadata.get('type')}):")
+            print(f"    {doc.splitlines()[0]}...") # Print first line of doc
+            relevant_schema_snippets.append(doc)
+        return relevant_schema_snippets
 
-    # Query the collection for similar schema documents
+    # Query the collection for similar schema documents, pre-filtering on
+    # table-name metadata when the question provided keyword hints
+    query_kwargs = {}
+    if candidate_tables:
+        query_kwargs["where"] = {"table_name": {"$in": candidate_tables}}
     results = collection.query(
         query_embeddings=[query_embedding],
         n_results=n_results,
-        include=['documents', 'metadatas', 'distances'] # Include documents and metadata in results
+        include=['documents', 'metadatas', 'distances'], # Include documents and metadata in results
+        **query_kwargs
     )
     
     relevant_schema_snippets = []
@@ -1,92 +1,579 @@
-# streamlit_app.py
-
-import streamlit as st
-import requests
-import pandas as pd
-import json
-import os
-
-# --- Configuration ---
-# Define the URL of your FastAPI backend
-# Make sure your FastAPI app.py is running on this address and port
-BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000/query-database")
-
-# --- Streamlit Page Configuration ---
-st.set_page_config(
-    page_title="SQL AI Agent (Ollama Local LLM)",
-    layout="wide", # Use wide layout for better dashboard experience
-    initial_sidebar_state="expanded"
-)
-
-# --- Title and Introduction ---
-st.title("💡 SQL AI Agent (Ollama Local LLM)")
-st.markdown("""
-Welcome to the **AI-powered SQL Agent**! Ask your data questions in natural language,
-and I'll generate and execute the SQL query for you. All processing is done locally
-using **Ollama** and **ChromaDB** for enhanced data security and privacy.
-""")
-
-st.divider()
-
-# --- User Input Section ---
-st.header("Ask Your Database a Question")
-user_question = st.text_area(
-    "Enter your natural language query here:",
-    placeholder="e.g., Show me the names and salaries of employees in the 'Sales' department.",
-    height=100,
-    key="user_query_input"
-)
-
-# Button to trigger the query
-if st.button("Generate & Execute SQL", key="execute_button"):
-    if user_question.strip() == "":
-        st.warning("Please enter a question before clicking the button.")
-    else:
-        # Display a spinner while processing
-        with st.spinner("Processing your request... (Generating SQL & Fetching Data)"):
-            try:
-                # Prepare the payload for the FastAPI backend
-                payload = {"natural_language_query": user_question}
-
-                # Make the POST request to your FastAPI backend
-                response = requests.post(BACKEND_URL, json=payload)
-                response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-                
-                # Parse the JSON response from the backend
-                data = response.json()
-                generated_sql = data.get("sql_query", "No SQL query generated.")
-                query_result = data.get("query_result", [])
-
-                st.success("Query processed successfully!")
-
-                # --- Display Generated SQL ---
-                st.subheader("Generated SQL Query:")
-                st.code(generated_sql, language="sql")
-
-                # --- Display Query Results ---
-                st.subheader("Query Results:")
-                if query_result:
-                    # Convert list of dicts to Pandas DataFrame for nice display
-                    df_results = pd.DataFrame(query_result)
-                    st.dataframe(df_results, use_container_width=True)
-                    
-                    # Optional: Add simple visualization if data is numeric
-                    if not df_results.empty and pd.api.types.is_numeric_dtype(df_results.iloc[:, -1]):
-                        st.line_chart(df_results.set_index(df_results.columns[0]))
-                else:
-                    st.info("No results found for this query or the query returned an empty set.")
-
-            except requests.exceptions.ConnectionError:
-                st.error(f"Failed to connect to the backend server at {BACKEND_URL}. Please ensure your FastAPI app (app.py) is running.")
-            except requests.exceptions.RequestException as e:
-                st.error(f"An error occurred during the request to the backend: {e}")
-                if response.status_code == 500:
-                    st.error(f"Backend Error Details: {response.json().get('detail', 'No details provided.')}")
-            except json.JSONDecodeError:
-                st.error("Received an invalid JSON response from the backend. Check backend logs.")
-            except Exception as e:
-                st.error(f"An unexpected error occurred: {e}")
-
-st.divider()
-st.caption("Architecture: Streamlit (Frontend) ➡️ FastAPI (Backend) ➡️ Langflow (AI Workflow) ➡️ Ollama (LLM) + ChromaDB (Vector DB) ➡️ Your Database")
-
+# streamlit_app.py
+
+from __future__ import annotations
+
+import streamlit as st
+import json
+import orjson # C-extension JSON parser; payload size scales with result rows
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Heavy imports (requests, numpy, pandas, pyarrow) are deferred into the
+# functions that need them: every Streamlit rerun re-executes this module,
+# and most reruns never touch the query path, so the idle rerun shouldn't
+# pay for loading them.
+
+# --- Import Pre-warming ---
+# The lazy imports above keep reruns cheap, but the first click would still
+# pay the one-time import cost while the user waits. A daemon thread warms
+# the modules while the user is reading the intro text; by click time the
+# in-function imports resolve to sys.modules lookups. Failures are ignored —
+# the lazy import will surface the real error on use.
+def _warm_imports() -> None:
+    for module_name in ("requests", "httpx", "numpy", "pandas", "pyarrow", "altair"):
+        try:
+            __import__(module_name)
+        except Exception:
+            pass
+
+threading.Thread(target=_warm_imports, daemon=True).start()
+
+# --- Configuration ---
+# Define the URL of your FastAPI backend
+# Make sure your FastAPI app.py is running on this address and port
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000/query-database")
+# Streaming variant of the endpoint: sends the generated SQL as soon as the
+# LLM returns it, then the rows once the database finishes executing.
+STREAM_BACKEND_URL = os.getenv("STREAM_BACKEND_URL", BACKEND_URL + "-stream")
+# Embedding endpoint used by the semantic prompt cache
+EMBED_URL = os.getenv("EMBED_URL", BACKEND_URL.rsplit("/", 1)[0] + "/embed")
+# Batch endpoint: several questions executed concurrently in one request
+BATCH_URL = os.getenv("BATCH_URL", BACKEND_URL.rsplit("/", 1)[0] + "/batch")
+
+# Rows fetched (and rendered) per page; large result sets are paginated
+# server-side instead of shipping every row to the browser
+PAGE_SIZE = 500
+# Results longer than the threshold are LTTB-downsampled to this many
+# representative points before charting
+CHART_MAX_POINTS = 2000
+CHART_DOWNSAMPLE_THRESHOLD = 5000
+
+# --- Exact Prompt Cache ---
+# Cheapest caching tier: an O(1) dict lookup keyed on the normalized
+# question text catches literal re-clicks before the (costlier) semantic
+# cache or the backend are consulted.
+EXACT_CACHE_TTL = 600
+EXACT_CACHE_MAX_ENTRIES = 128
+
+@st.cache_resource
+def get_exact_cache() -> OrderedDict:
+    """
+    Returns the exact-match prompt cache, shared across Streamlit reruns.
+    Maps normalized question -> (sql_query, query_result, expires_at).
+    """
+    return OrderedDict()
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question for exact-match caching: lowercased with
+    whitespace collapsed.
+    """
+    return " ".join(question.lower().split())
+
+def exact_cache_lookup(norm_question: str):
+    """
+    Returns the cached (sql_query, query_result) for a byte-identical
+    normalized question, or None on a miss or expired entry.
+    """
+    cache = get_exact_cache()
+    entry = cache.get(norm_question)
+    if entry is None:
+        return None
+    sql_query, query_result, expires_at = entry
+    if time.monotonic() >= expires_at:
+        del cache[norm_question]
+        return None
+    cache.move_to_end(norm_question)  # Mark as most recently used
+    return sql_query, query_result
+
+def exact_cache_store(norm_question: str, sql_query: str, query_result: list) -> None:
+    """
+    Adds an answered question to the exact-match cache, evicting the least
+    recently used entries past the cap.
+    """
+    cache = get_exact_cache()
+    cache[norm_question] = (sql_query, query_result, time.monotonic() + EXACT_CACHE_TTL)
+    while len(cache) > EXACT_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+
+# --- Semantic Prompt Cache ---
+# Rephrased repeats of the same question ("show sales employees" twice)
+# shouldn't hit the LLM again. Prompt embeddings are compared against prior
+# questions; above the similarity threshold the cached SQL and rows are
+# served without touching the backend. Persisted to disk across restarts.
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_ENTRIES = 256
+SEMANTIC_CACHE_PATH = os.path.expanduser("~/.cache/sqlagent/prompt_cache.pkl")
+
+@st.cache_resource
+def get_semantic_cache() -> dict:
+    """
+    Returns the semantic prompt cache, loading any persisted entries.
+    Embeddings are stored int8-quantized: a (N, dim) int8 matrix plus a
+    per-vector float32 scale, 4x smaller than fp32 so the similarity
+    sweep reads a quarter of the memory. A parallel list holds the
+    (sql_query, query_result) tuples.
+    """
+    import numpy as np
+
+    cache = {"matrix": None, "scales": None, "entries": []}
+    try:
+        with open(SEMANTIC_CACHE_PATH, "rb") as f:
+            saved = pickle.load(f)
+        if saved.get("entries"):
+            cache["matrix"] = np.asarray(saved["matrix"], dtype=np.int8)
+            cache["scales"] = np.asarray(saved["scales"], dtype=np.float32)
+            cache["entries"] = saved["entries"]
+    except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+        pass  # No cache yet, or one in the old fp32 format; start fresh
+    return cache
+
+def _quantize_embedding(vector: "np.ndarray"):
+    """
+    Quantizes a float32 embedding to int8 with a per-vector scale such
+    that dequantized dot products approximate the original cosine scores.
+    Returns (int8 vector, float scale).
+    """
+    import numpy as np
+
+    scale = float(np.abs(vector).max()) / 127.0
+    if scale == 0.0:
+        scale = 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+def semantic_cache_lookup(question_embedding: "np.ndarray | None"):
+    """
+    Returns the cached (sql_query, query_result) for the most similar prior
+    question, or None when nothing clears the similarity threshold.
+    """
+    import numpy as np
+
+    cache = get_semantic_cache()
+    if question_embedding is None or cache["matrix"] is None:
+        return None
+    # Integer dot products on the int8 matrix, with int32 accumulators so
+    # a 768-term sum cannot overflow; both scales multiply back afterwards
+    # to recover approximate cosine scores.
+    query_q, query_scale = _quantize_embedding(question_embedding)
+    scores = (cache["matrix"].astype(np.int32) @ query_q.astype(np.int32)).astype(np.float32)
+    scores *= cache["scales"] * np.float32(query_scale)
+    best = int(np.argmax(scores))
+    if scores[best] >= SEMANTIC_CACHE_THRESHOLD:
+        return cache["entries"][best]
+    return None
+
+def semantic_cache_store(question_embedding, sql_query: str, query_result: list) -> None:
+    """
+    Adds an answered question to the semantic cache (oldest entries are
+    dropped past the cap) and persists it to disk.
+    """
+    import numpy as np
+
+    if question_embedding is None:
+        return
+    cache = get_semantic_cache()
+    vector_q, scale = _quantize_embedding(question_embedding)
+    row = vector_q.reshape(1, -1)
+    if cache["matrix"] is None:
+        cache["matrix"] = row
+        cache["scales"] = np.asarray([scale], dtype=np.float32)
+    else:
+        cache["matrix"] = np.vstack([cache["matrix"], row])
+        cache["scales"] = np.append(cache["scales"], np.float32(scale))
+    cache["entries"].append((sql_query, query_result))
+    if len(cache["entries"]) > SEMANTIC_CACHE_MAX_ENTRIES:
+        overflow = len(cache["entries"]) - SEMANTIC_CACHE_MAX_ENTRIES
+        cache["matrix"] = cache["matrix"][overflow:]
+        cache["scales"] = cache["scales"][overflow:]
+        cache["entries"] = cache["entries"][overflow:]
+    try:
+        os.makedirs(os.path.dirname(SEMANTIC_CACHE_PATH), exist_ok=True)
+        with open(SEMANTIC_CACHE_PATH, "wb") as f:
+            pickle.dump({
+                "matrix": cache["matrix"],
+                "scales": cache["scales"],
+                "entries": cache["entries"],
+            }, f)
+    except OSError:
+        pass  # Persistence is best-effort; the in-memory cache still works
+
+def rows_to_dataframe(rows: list) -> pd.DataFrame:
+    """
+    Builds a DataFrame from result-row dictionaries via a PyArrow table.
+    Arrow ingests the rows in native code and hands pandas zero-copy column
+    arrays, bypassing pd.DataFrame's row-wise Python construction (and
+    Streamlit re-serializes to Arrow for display anyway).
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    if not rows:
+        return pd.DataFrame()
+    try:
+        return pa.Table.from_pylist(rows).to_pandas(types_mapper=pd.ArrowDtype)
+    except Exception:
+        # Mixed-type or otherwise exotic values: fall back to pandas
+        return pd.DataFrame(rows)
+
+# --- Chart Downsampling ---
+def lttb_downsample(df: "pd.DataFrame", n_out: int = CHART_MAX_POINTS) -> "pd.DataFrame":
+    """
+    Largest-Triangle-Three-Buckets downsampling on the frame's last column.
+    Keeps the n_out rows that best preserve the visual shape of the series
+    (peaks and troughs survive, unlike strided slicing). Row order stands
+    in for the x axis, so the selection works for non-numeric x columns.
+    """
+    import numpy as np
+
+    n = len(df)
+    if n <= n_out:
+        return df
+    x = np.arange(n, dtype=np.float64)
+    y = df.iloc[:, -1].to_numpy(dtype=np.float64)
+
+    bucket_size = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.intp)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0  # index of the previously selected point
+    for i in range(n_out - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        # Average of the following bucket anchors the triangle's third vertex
+        avg_x = x[end:next_end].mean() if end < next_end else x[-1]
+        avg_y = y[end:next_end].mean() if end < next_end else y[-1]
+        # Pick the point in this bucket forming the largest triangle with
+        # the previous pick and the next bucket's average
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return df.iloc[indices]
+
+# --- HTTP Session ---
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    Returns a pooled HTTP session shared across Streamlit reruns.
+    Keep-alive connections to the FastAPI backend are reused instead of
+    paying a fresh TCP handshake on every button click.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Advertise compression explicitly; the backend gzips large payloads and
+    # requests decompresses transparently
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+# --- Async Backend Access ---
+# The embed lookup (feeding the semantic cache) and the backend request are
+# raced instead of run back-to-back: both start immediately, and when the
+# embedding wins the race with a cache hit the backend call is cancelled.
+# The embed round-trip therefore hides entirely under the backend's latency.
+async def _resolve_embedding(emb_task) -> "np.ndarray | None":
+    """
+    Awaits an in-flight embed request and returns the normalized vector.
+    Returns None when the embedding service is unavailable, in which case
+    the semantic cache is simply bypassed.
+    """
+    import numpy as np
+
+    try:
+        response = await emb_task
+        response.raise_for_status()
+        vector = np.asarray(orjson.loads(response.content)["embedding"], dtype=np.float32)
+        vector /= max(np.linalg.norm(vector), 1e-12)
+        return vector
+    except Exception:
+        return None
+
+async def _stream_backend_sse(client, payload: dict, sql_placeholder):
+    """
+    Consumes the backend's SSE stream, rendering the generated SQL into
+    sql_placeholder as soon as its frame arrives (while the database is
+    still executing the query). Returns (sql, rows, error_detail).
+    """
+    generated_sql = "No SQL query generated."
+    query_result = []
+    error_detail = None
+    current_event = None
+    async with client.stream("POST", STREAM_BACKEND_URL, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            if line.startswith("event:"):
+                current_event = line.split(":", 1)[1].strip()
+            elif line.startswith("data:"):
+                frame = orjson.loads(line.split(":", 1)[1].strip())
+                if current_event == "sql":
+                    generated_sql = frame.get("sql_query", generated_sql)
+                    # --- Display Generated SQL (before rows arrive) ---
+                    with sql_placeholder:
+                        st.subheader("Generated SQL Query:")
+                        st.code(generated_sql, language="sql")
+                elif current_event == "result":
+                    query_result = frame.get("query_result", [])
+                elif current_event == "error":
+                    error_detail = frame.get("detail", "Unknown backend error.")
+    return generated_sql, query_result, error_detail
+
+async def _query_backend_raced(payload: dict, question: str, check_semantic: bool, sql_placeholder):
+    """
+    Starts the embed lookup and the backend request concurrently. When the
+    embedding comes back first and the semantic cache clears its threshold,
+    the backend request is cancelled and the cached answer served instead.
+    Returns (source, sql, rows, error_detail, embedding) with source either
+    "semantic" or "backend".
+    """
+    import asyncio
+    import httpx
+
+    question_embedding = None
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(300.0, connect=3.0),
+        headers={"Accept-Encoding": "gzip, deflate"},
+    ) as client:
+        post_task = asyncio.create_task(_stream_backend_sse(client, payload, sql_placeholder))
+        emb_task = None
+        if check_semantic:
+            emb_task = asyncio.create_task(
+                client.post(EMBED_URL, json={"text": question}, timeout=30.0)
+            )
+            done, _pending = await asyncio.wait(
+                {emb_task, post_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if emb_task in done:
+                question_embedding = await _resolve_embedding(emb_task)
+                cached = semantic_cache_lookup(question_embedding)
+                if cached is not None and not post_task.done():
+                    post_task.cancel()
+                    await asyncio.gather(post_task, return_exceptions=True)
+                    return "semantic", cached[0], cached[1], None, question_embedding
+
+        generated_sql, query_result, error_detail = await post_task
+        if emb_task is not None and question_embedding is None:
+            # The backend won the race; harvest the embedding anyway so the
+            # answer can still be stored in the semantic cache.
+            question_embedding = await _resolve_embedding(emb_task)
+        return "backend", generated_sql, query_result, error_detail, question_embedding
+
+# --- Streamlit Page Configuration ---
+st.set_page_config(
+    page_title="SQL AI Agent (Ollama Local LLM)",
+    layout="wide", # Use wide layout for better dashboard experience
+    initial_sidebar_state="expanded"
+)
+
+# --- Title and Introduction ---
+st.title("💡 SQL AI Agent (Ollama Local LLM)")
+st.markdown("""
+Welcome to the **AI-powered SQL Agent**! Ask your data questions in natural language,
+and I'll generate and execute the SQL query for you. All processing is done locally
+using **Ollama** and **ChromaDB** for enhanced data security and privacy.
+""")
+
+st.divider()
+
+# --- User Input Section ---
+st.header("Ask Your Database a Question")
+user_question = st.text_area(
+    "Enter your natural language query here:",
+    placeholder="e.g., Show me the names and salaries of employees in the 'Sales' department.",
+    height=100,
+    key="user_query_input"
+)
+
+# Batch mode sends one question per line to the /batch endpoint, letting the
+# backend run them concurrently and amortize the HTTP round-trip.
+batch_mode = st.checkbox("Batch mode (one question per line)", key="batch_mode")
+
+# Result page selector: each page fetches PAGE_SIZE rows from the backend
+result_page = st.number_input(
+    f"Result page ({PAGE_SIZE} rows per page)",
+    min_value=1,
+    value=1,
+    step=1,
+    key="result_page",
+)
+
+# Button to trigger the query
+if st.button("Generate & Execute SQL", key="execute_button"):
+    if user_question.strip() == "":
+        st.warning("Please enter a question before clicking the button.")
+    else:
+        # Display a spinner while processing
+        with st.spinner("Processing your request... (Generating SQL & Fetching Data)"):
+            try:
+                # Lazy imports: only the query path needs these, and after
+                # the first click they resolve to sys.modules lookups
+                import httpx
+                import requests
+                import pandas as pd
+
+                if batch_mode:
+                    # --- Batch mode: one question per line, run concurrently ---
+                    questions = [q.strip() for q in user_question.splitlines() if q.strip()]
+                    batch_payload = {
+                        "requests": [
+                            {"id": i, "natural_language_query": q}
+                            for i, q in enumerate(questions)
+                        ]
+                    }
+                    response = get_session().post(BATCH_URL, json=batch_payload, timeout=(3, 600))
+                    response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+
+                    results_by_id = {r["id"]: r for r in orjson.loads(response.content).get("results", [])}
+                    st.success(f"Processed {len(questions)} queries in one batch!")
+
+                    # One tab per question, keeping the submitted order
+                    tabs = st.tabs([f"Query {i + 1}" for i in range(len(questions))])
+                    for i, tab in enumerate(tabs):
+                        with tab:
+                            st.caption(questions[i])
+                            result = results_by_id.get(i, {})
+                            if result.get("error"):
+                                st.error(f"Backend Error Details: {result['error']}")
+                                continue
+                            st.code(result.get("sql_query", "No SQL query generated."), language="sql")
+                            rows = result.get("query_result", [])
+                            if rows:
+                                st.dataframe(rows_to_dataframe(rows), use_container_width=True)
+                            else:
+                                st.info("No results found for this query or the query returned an empty set.")
+                else:
+                    # Prepare the payload for the FastAPI backend, fetching
+                    # only the requested page of rows
+                    payload = {
+                        "natural_language_query": user_question,
+                        "offset": (int(result_page) - 1) * PAGE_SIZE,
+                        "limit": PAGE_SIZE,
+                    }
+
+                    # --- Prompt cache lookup: exact tier first, then semantic ---
+                    # A repeated or near-identical earlier question is answered
+                    # locally, skipping the LLM and database entirely.
+                    # Pages past the first get their own cache slots.
+                    norm_question = normalize_question(user_question)
+                    if int(result_page) > 1:
+                        norm_question += f" [page {int(result_page)}]"
+                    cached = exact_cache_lookup(norm_question)
+
+                    if cached is not None:
+                        generated_sql, query_result = cached
+                        st.info("Answered from the prompt cache (this question was asked before).")
+                        st.subheader("Generated SQL Query:")
+                        st.code(generated_sql, language="sql")
+                    else:
+                        # Race the embed lookup against the backend request:
+                        # both start at once, and a semantic-cache hit cancels
+                        # the backend call mid-flight. The semantic tier only
+                        # serves first pages: deeper pages share the same
+                        # question embedding but hold different rows.
+                        import asyncio
+
+                        sql_placeholder = st.container()
+                        source, generated_sql, query_result, error_detail, question_embedding = asyncio.run(
+                            _query_backend_raced(
+                                payload,
+                                user_question,
+                                check_semantic=int(result_page) == 1,
+                                sql_placeholder=sql_placeholder,
+                            )
+                        )
+
+                        if error_detail is not None:
+                            st.error(f"Backend Error Details: {error_detail}")
+                            st.stop()
+
+                        if source == "semantic":
+                            st.info("Answered from the prompt cache (this question was asked before).")
+                            st.subheader("Generated SQL Query:")
+                            st.code(generated_sql, language="sql")
+                        else:
+                            # Remember the answer for repeated and semantically
+                            # similar questions
+                            exact_cache_store(norm_question, generated_sql, query_result)
+                            semantic_cache_store(question_embedding, generated_sql, query_result)
+
+                    st.success("Query processed successfully!")
+
+                    # Hand the answer to the fragment below: it renders from
+                    # session state, so the result also survives later reruns.
+                    st.session_state["last_result"] = {
+                        "sql_query": generated_sql,
+                        "query_result": query_result,
+                    }
+
+            except (requests.exceptions.ConnectionError, httpx.ConnectError):
+                st.error(f"Failed to connect to the backend server at {BACKEND_URL}. Please ensure your FastAPI app (app.py) is running.")
+            except requests.exceptions.RequestException as e:
+                st.error(f"An error occurred during the request to the backend: {e}")
+                if response.status_code == 500:
+                    st.error(f"Backend Error Details: {response.json().get('detail', 'No details provided.')}")
+            except json.JSONDecodeError:
+                st.error("Received an invalid JSON response from the backend. Check backend logs.")
+            except Exception as e:
+                st.error(f"An unexpected error occurred: {e}")
+
+# --- Results Area ---
+@st.fragment
+def render_results():
+    """
+    Renders the last answered query's rows and chart from session state.
+    Fragment-scoped: interactions inside this block rerun only the block
+    instead of the whole script, so the dataframe is not re-serialized to
+    the browser on every widget interaction — and because the rows live in
+    session state, the last result stays on screen across reruns.
+    """
+    last_result = st.session_state.get("last_result")
+    if last_result is None:
+        return
+    query_result = last_result["query_result"]
+
+    # --- Display Query Results ---
+    st.subheader("Query Results:")
+    if query_result:
+        # Convert list of dicts to a DataFrame via Arrow for display
+        df_results = rows_to_dataframe(query_result)
+        st.dataframe(df_results, use_container_width=True)
+
+        # Optional: Add simple visualization if data is numeric.
+        # Probe the dtype kind directly instead of inspecting
+        # the column's values. Long results are LTTB-downsampled
+        # server-side so the browser payload stays bounded
+        # regardless of how many rows came back; a single row
+        # draws nothing, so the chart is skipped below 2.
+        last_kind = df_results.dtypes.iat[-1].kind
+        if df_results.shape[0] >= 2 and last_kind in "iuf":
+            import altair as alt
+
+            alt.data_transformers.enable("default", max_rows=CHART_DOWNSAMPLE_THRESHOLD)
+            df_chart = df_results
+            if len(df_chart) > CHART_DOWNSAMPLE_THRESHOLD:
+                df_chart = lttb_downsample(df_chart)
+            chart = (
+                alt.Chart(df_chart)
+                .mark_line()
+                .encode(x=df_chart.columns[0], y=df_chart.columns[-1])
+            )
+            st.altair_chart(chart, use_container_width=True)
+    else:
+        st.info("No results found for this query or the query returned an empty set.")
+
+render_results()
+
+st.divider()
+st.caption("Architecture: Streamlit (Frontend) ➡️ FastAPI (Backend) ➡️ Langflow (AI Workflow) ➡️ Ollama (LLM) + ChromaDB (Vector DB) ➡️ Your Database")
+